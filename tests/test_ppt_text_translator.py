@@ -0,0 +1,111 @@
+import io
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pptx")
+pytest.importorskip("openai")
+
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "trip7_ppt_translation"))
+
+import ppt_text_translator
+from ppt_text_translator import _chunk_texts, _parse_numbered_translation, _set_text_keep_format
+
+
+def _make_textbox(text):
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    text_frame = slide.shapes.add_textbox(0, 0, Inches(4), Inches(1)).text_frame
+    text_frame.text = text
+    for paragraph in text_frame.paragraphs:
+        for run in paragraph.runs:
+            run.font.bold = True
+            run.font.size = Pt(24)
+    return prs, text_frame
+
+
+def _reload_text_frame(prs):
+    buf = io.BytesIO()
+    prs.save(buf)
+    buf.seek(0)
+    return Presentation(buf).slides[0].shapes[0].text_frame
+
+
+def test_soft_line_break_round_trip():
+    prs, text_frame = _make_textbox("第一行\v软换行")
+    assert text_frame.text == "第一行\v软换行"
+
+    _set_text_keep_format(text_frame, "一行目\v改行")
+
+    reloaded = _reload_text_frame(prs)
+    assert reloaded.text == "一行目\v改行"
+    assert "_x000B_" not in reloaded.text
+    runs = reloaded.paragraphs[0].runs
+    assert [run.text for run in runs] == ["一行目", "改行"]
+    assert all(run.font.bold and run.font.size == Pt(24) for run in runs)
+
+
+def test_paragraphs_follow_translated_lines():
+    prs, text_frame = _make_textbox("第一段\n第二段\n第三段")
+
+    _set_text_keep_format(text_frame, "一段目\n二段目")
+
+    reloaded = _reload_text_frame(prs)
+    assert reloaded.text == "一段目\n二段目"
+    assert all(p.runs[0].font.bold for p in reloaded.paragraphs)
+
+
+def test_leading_empty_paragraphs_are_skipped():
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    text_frame = slide.shapes.add_textbox(0, 0, Inches(4), Inches(1)).text_frame
+    text_frame.text = "\n标题\n正文"
+    title_run = text_frame.paragraphs[1].runs[0]
+    title_run.font.bold = True
+    title_run.font.size = Pt(40)
+    text_frame.paragraphs[2].runs[0].font.size = Pt(18)
+
+    _set_text_keep_format(text_frame, "タイトル\n本文")
+
+    reloaded = _reload_text_frame(prs)
+    assert [p.text for p in reloaded.paragraphs] == ["", "タイトル", "本文"]
+    title, body = reloaded.paragraphs[1].runs[0], reloaded.paragraphs[2].runs[0]
+    assert title.font.bold and title.font.size == Pt(40)
+    assert not body.font.bold and body.font.size == Pt(18)
+
+
+def test_parse_numbered_translation():
+    assert _parse_numbered_translation("1. 一\n2. 二\n3. 三", 3) == ["一", "二", "三"]
+    assert _parse_numbered_translation("1. 一行目\n二行目\n2. 二", 2) == ["一行目\n二行目", "二"]
+
+
+def test_parse_numbered_translation_rejects_numbering_mismatch():
+    assert _parse_numbered_translation("1. 一\n2. 二", 3) is None
+    assert _parse_numbered_translation("1. 一\n3. 三", 2) is None
+
+
+def test_parse_numbered_translation_rejects_leading_preamble():
+    assert _parse_numbered_translation("以下は翻訳です:\n1. 一\n2. 二", 2) is None
+
+
+def test_parse_numbered_translation_rejects_nested_numbering():
+    # 原文自带"2. "行时，译文中的编号会多出一项
+    assert _parse_numbered_translation("1. 手順\n2. 第二歩\n2. 二", 2) is None
+
+
+def test_chunk_texts_respects_count_and_token_limits(monkeypatch):
+    monkeypatch.setattr(ppt_text_translator, "MAX_TEXTS_PER_REQUEST", 2)
+    assert list(_chunk_texts(["a", "b", "c"])) == [["a", "b"], ["c"]]
+
+    monkeypatch.setattr(ppt_text_translator, "MAX_TEXTS_PER_REQUEST", 50)
+    monkeypatch.setattr(ppt_text_translator, "MAX_INPUT_TOKENS_PER_REQUEST", 10)
+    assert list(_chunk_texts(["一" * 8, "二" * 8])) == [["一" * 8], ["二" * 8]]
+
+
+def test_chunk_texts_isolates_texts_with_numbered_lines():
+    texts = ["标题", "步骤\n2. 第二步", "正文"]
+    assert list(_chunk_texts(texts)) == [["标题"], ["步骤\n2. 第二步"], ["正文"]]
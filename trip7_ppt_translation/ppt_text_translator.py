@@ -1,16 +1,134 @@
 from pptx import Presentation
+from pptx.oxml.xmlchemy import OxmlElement
+from pptx.shapes.picture import Picture
 import os
+import io
+import sys
+import copy
+import contextlib
+import re
 import json
 import time
+import shutil
+import sqlite3
+import zipfile
+import random
+import hashlib
+import asyncio
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import openai
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库json
+    orjson = None
 
 # OpenAI API配置
 # 请在这里设置您的API key
 OPENAI_API_KEY = ""  # 请替换为您的实际API key
-client = OpenAI(api_key=OPENAI_API_KEY)
+_client = None
+
+# 翻译使用的模型
+MODEL = "gpt-4o-mini"
+# 较低的temperature确保翻译的一致性
+TEMPERATURE = 0.1
+# 单个文本块译文的输出token上限
+MAX_OUTPUT_TOKENS = 1000
+
+# 译文缓存文件，重复出现的文本（页眉、页脚、公司名等）不再重复请求API
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_cache.sqlite")
+_cache_conn = None
+
+# 请求超时：基础秒数，再按输出token上限和最慢生成速度（token/秒）追加等待时间
+REQUEST_TIMEOUT_BASE = 60.0
+MIN_OUTPUT_TOKENS_PER_SECOND = 20
+
+# 同时在途的翻译请求上限
+MAX_CONCURRENT_REQUESTS = 20
+
+# 账号的速率限制（每分钟请求数、每分钟token数），用于主动限流
+MAX_REQUESTS_PER_MINUTE = 3500
+MAX_TOKENS_PER_MINUTE = 90000
+# 遇到429时的最大尝试次数（指数退避+随机抖动）
+MAX_RATE_LIMIT_RETRIES = 8
+
+# 单次请求打包的文本块上限，以及按估算输入token数的上限
+MAX_TEXTS_PER_REQUEST = 50
+MAX_INPUT_TOKENS_PER_REQUEST = 2000
+# 打包请求的输出token上限
+BATCH_MAX_TOKENS = 4000
+
+# 打包翻译结果中每个编号条目的起始位置，如 "1. "
+_NUMBERED_ITEM_RE = re.compile(r'^(\d+)\.\s', re.MULTILINE)
+
+# 待翻译（去重且未命中缓存）的文本数达到该阈值时改用Batch API离线翻译，较小的PPT仍走并发同步请求
+BATCH_API_MIN_TEXTS = 500
+# Batch API任务状态轮询间隔（秒）
+BATCH_POLL_INTERVAL = 30
+
+# 并行写出图片文件的线程数
+IMAGE_WRITE_WORKERS = 8
+# 写图片文件时使用的缓冲区大小（1 MiB）
+IMAGE_WRITE_BUFFER_SIZE = 1 << 20
+
+def _write_bytes(path, data):
+    with open(path, "wb", buffering=IMAGE_WRITE_BUFFER_SIZE) as f:
+        f.write(data)
+
+def _write_json(path, data):
+    """
+    以缩进格式写出JSON，优先使用更快的orjson
+    """
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+def write_slides_ndjson(path, slides):
+    """
+    以NDJSON格式（每行一页幻灯片）写出中间结果，比缩进JSON更小、更快
+    """
+    with open(path, "wb") as f:
+        for slide in slides:
+            if orjson is not None:
+                f.write(orjson.dumps(slide))
+            else:
+                f.write(json.dumps(slide, ensure_ascii=False).encode("utf-8"))
+            f.write(b"\n")
+
+def extract_images_fast(ppt_path, output_dir):
+    """
+    直接从PPTX压缩包的 ppt/media/ 目录导出图片，不解析幻灯片XML
+    
+    Args:
+        ppt_path (str): PPT文件路径
+        output_dir (str): 输出目录
+    
+    Returns:
+        list: 导出的图片文件名列表
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    
+    image_names = []
+    with zipfile.ZipFile(ppt_path) as z:
+        for name in z.namelist():
+            if not name.startswith("ppt/media/") or name.endswith("/"):
+                continue
+            image_name = os.path.basename(name)
+            with z.open(name) as src, open(os.path.join(output_dir, image_name), "wb") as dst:
+                shutil.copyfileobj(src, dst, IMAGE_WRITE_BUFFER_SIZE)
+            image_names.append(image_name)
+    
+    print(f"✅ 图片导出完成，共 {len(image_names)} 张。结果保存在：{output_dir}")
+    return image_names
 
-def extract_ppt_content(ppt_path, output_dir="ppt_output", save_images=True):
+def extract_ppt_content(ppt_path, output_dir="ppt_output", save_images=True, prs=None, images_only=False,
+                        ndjson=False):
     """
     提取PPTX文件的纯文本内容，按页数一一对应
     
@@ -18,58 +136,81 @@ def extract_ppt_content(ppt_path, output_dir="ppt_output", save_images=True):
         ppt_path (str): PPT文件路径
         output_dir (str): 输出目录
         save_images (bool): 是否保存图片文件
+        prs (Presentation): 已解析的PPT对象，传入时不再重复解析文件
+        images_only (bool): 只导出图片，跳过文本提取和PPT解析
+        ndjson (bool): 改为输出紧凑的 ppt_content.ndjson（每行一页），默认输出带缩进的 ppt_content.json
     
     Returns:
-        list: 包含所有幻灯片信息的列表
+        tuple: (包含所有幻灯片信息的列表, PPT对象)；
+            images_only时为 (导出的图片文件名列表, None)
     """
     # 检查文件是否存在
     if not os.path.exists(ppt_path):
         raise FileNotFoundError(f"PPT文件不存在: {ppt_path}")
     
-    prs = Presentation(ppt_path)
+    if images_only:
+        return extract_images_fast(ppt_path, output_dir), None
+    
+    if prs is None:
+        prs = Presentation(ppt_path)
     os.makedirs(output_dir, exist_ok=True)
     
     all_slides = []
     
-    for i, slide in enumerate(prs.slides, start=1):
-        slide_info = {
-            "slide_number": i,
-            "texts": [],
-            "images": []
-        }
-        
-        for shape in slide.shapes:
-            # 提取纯文字内容
-            if hasattr(shape, "text") and shape.text.strip():
-                slide_info["texts"].append({
-                    "content": shape.text.strip()
-                })
+    # 图片写盘交给线程池，遍历形状（python-pptx非线程安全）仍在当前线程；
+    # 退出with时等待所有写盘完成，出错时也会回收线程
+    write_futures = {}
+    pool_ctx = ThreadPoolExecutor(max_workers=IMAGE_WRITE_WORKERS) if save_images else contextlib.nullcontext()
+    with pool_ctx as pool:
+        for i, slide in enumerate(prs.slides, start=1):
+            slide_info = {
+                "slide_number": i,
+                "texts": [],
+                "images": []
+            }
             
-            # 提取图片（如果需要）
-            if shape.shape_type == 13:  # 13表示图片类型
-                try:
-                    image = shape.image
-                    image_bytes = image.blob
-                    image_ext = image.ext
-                    image_name = f"slide_{i}_img_{len(slide_info['images']) + 1}.{image_ext}"
-                    image_path = os.path.join(output_dir, image_name)
-                    
-                    if save_images:
-                        with open(image_path, "wb") as f:
-                            f.write(image_bytes)
-                    
-                    slide_info["images"].append({
-                        "filename": image_name
+            for shape in slide.shapes:
+                # 提取纯文字内容（只读取一次文本框的文本；重复的页眉页脚等共用同一个字符串对象）
+                tf = shape.text_frame if shape.has_text_frame else None
+                text = sys.intern(tf.text.strip()) if tf is not None else ""
+                if text:
+                    slide_info["texts"].append({
+                        "content": text
                     })
-                except Exception as e:
-                    print(f"⚠️ 提取第{i}页图片时出错: {e}")
-        
-        all_slides.append(slide_info)
+                
+                # 提取图片（如果需要）
+                if isinstance(shape, Picture):
+                    # 损坏的图片关系仍可能在访问image时抛出异常
+                    try:
+                        image = shape.image
+                        image_bytes = image.blob
+                        image_ext = image.ext
+                        image_name = f"slide_{i}_img_{len(slide_info['images']) + 1}.{image_ext}"
+                        image_path = os.path.join(output_dir, image_name)
+                        
+                        if save_images:
+                            future = pool.submit(_write_bytes, image_path, image_bytes)
+                            write_futures[future] = image_name
+                        
+                        slide_info["images"].append({
+                            "filename": image_name
+                        })
+                    except Exception as e:
+                        print(f"⚠️ 提取第{i}页图片时出错: {e}")
+            
+            all_slides.append(slide_info)
+    
+    for future, image_name in write_futures.items():
+        if future.exception() is not None:
+            print(f"⚠️ 保存图片 {image_name} 时出错: {future.exception()}")
     
     # 导出为JSON
-    json_path = os.path.join(output_dir, "ppt_content.json")
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(all_slides, f, ensure_ascii=False, indent=2)
+    if ndjson:
+        json_path = os.path.join(output_dir, "ppt_content.ndjson")
+        write_slides_ndjson(json_path, all_slides)
+    else:
+        json_path = os.path.join(output_dir, "ppt_content.json")
+        _write_json(json_path, all_slides)
     
     print(f"✅ 提取完成，共 {len(all_slides)} 页。结果保存在：{json_path}")
     
@@ -78,52 +219,351 @@ def extract_ppt_content(ppt_path, output_dir="ppt_output", save_images=True):
     total_images = sum(len(slide["images"]) for slide in all_slides)
     print(f"📊 统计信息: 文本块 {total_texts} 个，图片 {total_images} 张")
     
-    return all_slides
+    return all_slides, prs
+
+TRANSLATION_SYSTEM_PROMPT = "你是一个专业的中文到日语翻译助手。请将用户提供的中文文本准确翻译成日语，保持原文的语气和含义。对于专业术语，请使用准确的日语表达。"
+
+def _build_messages(text):
+    """
+    构造单个文本块的翻译请求消息
+    """
+    return [
+        {
+            "role": "system",
+            "content": TRANSLATION_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"请将以下中文文本翻译成日语，保持原文的换行和行数：\n{text}"
+        }
+    ]
+
+class RateLimiter:
+    """
+    令牌桶限流器，同时跟踪每分钟请求数和token数，
+    只有在任一额度不足时才等待，而不是每次请求后固定休眠
+    """
+    
+    def __init__(self, max_requests_per_minute, max_tokens_per_minute):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.available_request_capacity = max_requests_per_minute
+        self.available_token_capacity = max_tokens_per_minute
+        self.last_update_time = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_update_time
+        self.available_request_capacity = min(
+            self.max_requests_per_minute,
+            self.available_request_capacity + self.max_requests_per_minute * elapsed / 60
+        )
+        self.available_token_capacity = min(
+            self.max_tokens_per_minute,
+            self.available_token_capacity + self.max_tokens_per_minute * elapsed / 60
+        )
+        self.last_update_time = now
+    
+    async def acquire(self, tokens):
+        """
+        等待直到有足够的请求额度和token额度，然后扣除
+        """
+        tokens = min(tokens, self.max_tokens_per_minute)
+        while True:
+            self._refill()
+            if self.available_request_capacity >= 1 and self.available_token_capacity >= tokens:
+                self.available_request_capacity -= 1
+                self.available_token_capacity -= tokens
+                return
+            
+            # 按缺口计算需要等待的时间
+            wait = max(
+                (1 - self.available_request_capacity) * 60 / self.max_requests_per_minute,
+                (tokens - self.available_token_capacity) * 60 / self.max_tokens_per_minute
+            )
+            await asyncio.sleep(wait)
+
+rate_limiter = RateLimiter(MAX_REQUESTS_PER_MINUTE, MAX_TOKENS_PER_MINUTE)
+
+def _get_cache():
+    """
+    获取模块级的缓存数据库连接，首次调用时建表
+    """
+    global _cache_conn
+    if _cache_conn is None:
+        _cache_conn = sqlite3.connect(CACHE_PATH)
+        _cache_conn.execute("PRAGMA journal_mode=WAL")
+        _cache_conn.execute("CREATE TABLE IF NOT EXISTS tx (key BLOB PRIMARY KEY, value TEXT)")
+    return _cache_conn
+
+def _cache_key(text):
+    return hashlib.blake2b(f"{MODEL}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+def _cache_get(text):
+    """
+    查询缓存的译文，未命中时返回None
+    """
+    row = _get_cache().execute("SELECT value FROM tx WHERE key = ?", (_cache_key(text),)).fetchone()
+    return row[0] if row else None
+
+def _cache_put(text, translated_text):
+    conn = _get_cache()
+    conn.execute("INSERT OR REPLACE INTO tx (key, value) VALUES (?, ?)", (_cache_key(text), translated_text))
+    conn.commit()
+
+def _cache_put_many(pairs):
+    """
+    批量写入 (原文, 译文)，整批只提交一次事务
+    """
+    conn = _get_cache()
+    conn.executemany(
+        "INSERT OR REPLACE INTO tx (key, value) VALUES (?, ?)",
+        [(_cache_key(text), translated_text) for text, translated_text in pairs]
+    )
+    conn.commit()
+
+def _estimate_tokens(text):
+    """
+    粗略估算文本的token数（中日文约每字1个token）
+    """
+    return len(text)
+
+def _estimate_request_tokens(text):
+    """
+    估算一次翻译请求消耗的token数：输入 + 同等长度的输出 + 提示词开销
+    """
+    return _estimate_tokens(text) * 2 + 300
+
+def _max_output_tokens(text, limit):
+    """
+    按原文长度估算输出token上限（中文约1 token/字，日文约1.2 token/字，取1.6倍留余量）
+    """
+    return min(limit, max(64, int(len(text) * 1.6) + 32))
+
+def _get_client():
+    """
+    获取同步客户端（Batch API使用），首次调用时创建，避免导入模块时就要求API key
+    """
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=OPENAI_API_KEY)
+    return _client
+
+def _create_async_client():
+    """
+    创建本次运行使用的异步客户端
+    
+    连接池绑定在创建它的事件循环上，每次 asyncio.run 都要新建并在循环结束前关闭。
+    一次运行内的所有请求共用该连接池；安装了h2时启用HTTP/2，在单个连接上复用并发请求。
+    """
+    http_client = httpx.AsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+        timeout=REQUEST_TIMEOUT_BASE
+    )
+    # 关闭SDK自带的重试，429只由 _create_chat_completion 经限流器后重试
+    return AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client, max_retries=0)
+
+def _request_timeout(max_tokens):
+    """
+    按输出token上限放宽超时，避免长的打包请求在生成途中被中断
+    """
+    return REQUEST_TIMEOUT_BASE + max_tokens / MIN_OUTPUT_TOKENS_PER_SECOND
+
+def _is_insufficient_quota(error):
+    """
+    额度用尽同样返回429，但重试不会成功
+    """
+    return isinstance(error, openai.RateLimitError) and error.code == "insufficient_quota"
+
+def _is_fatal_error(error):
+    """
+    鉴权失败、无权限、模型不存在、额度用尽等错误拆分重试也不会成功，应直接中止
+    """
+    return (isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError, openai.NotFoundError))
+            or _is_insufficient_quota(error))
 
-def translate_to_japanese(text):
+async def _create_chat_completion(aclient, estimated_tokens, **kwargs):
+    """
+    经限流器放行后调用Chat Completions API，遇到429时指数退避重试（额度用尽时直接抛出）
+    """
+    kwargs.setdefault("timeout", _request_timeout(kwargs["max_tokens"]))
+    for attempt in range(MAX_RATE_LIMIT_RETRIES):
+        await rate_limiter.acquire(estimated_tokens)
+        try:
+            return await aclient.chat.completions.create(**kwargs)
+        except openai.RateLimitError as e:
+            if attempt == MAX_RATE_LIMIT_RETRIES - 1 or _is_insufficient_quota(e):
+                raise
+            delay = random.uniform(0, 2 ** attempt)
+            print(f"⚠️ 触发速率限制，{delay:.1f}秒后重试")
+            await asyncio.sleep(delay)
+
+async def translate_to_japanese(text, sem, aclient):
     """
     使用OpenAI API将文本翻译成日语
     
     Args:
         text (str): 要翻译的文本
+        sem (asyncio.Semaphore): 限制并发请求数的信号量
+        aclient (AsyncOpenAI): 本次运行使用的异步客户端
     
     Returns:
         str: 翻译后的日语文本
     """
-    try:
-        # 使用OpenAI API进行翻译
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # 或者使用 "gpt-4" 获得更好的翻译质量
-            messages=[
-                {
-                    "role": "system",
-                    "content": "你是一个专业的中文到日语翻译助手。请将用户提供的中文文本准确翻译成日语，保持原文的语气和含义。对于专业术语，请使用准确的日语表达。"
-                },
-                {
-                    "role": "user",
-                    "content": f"请将以下中文文本翻译成日语：\n{text}"
-                }
-            ],
-            temperature=0.3,  # 较低的temperature确保翻译的一致性
-            max_tokens=1000
-        )
-        
-        translated_text = response.choices[0].message.content.strip()
-        return translated_text
-        
-    except Exception as e:
-        print(f"⚠️ OpenAI翻译失败: {e}")
-        return text  # 翻译失败时返回原文
+    cached = _cache_get(text)
+    if cached is not None:
+        return cached
+    
+    async with sem:
+        try:
+            # 使用OpenAI API进行翻译
+            response = await _create_chat_completion(
+                aclient,
+                _estimate_request_tokens(text),
+                model=MODEL,
+                messages=_build_messages(text),
+                temperature=TEMPERATURE,
+                max_tokens=_max_output_tokens(text, MAX_OUTPUT_TOKENS)
+            )
+            
+            choice = response.choices[0]
+            if choice.finish_reason == "length":
+                # 译文被max_tokens截断，不写入缓存
+                print(f"⚠️ OpenAI译文被截断，保留原文: {text[:30]}")
+                return text
+            
+            translated_text = choice.message.content.strip()
+            _cache_put(text, translated_text)
+            return translated_text
+            
+        except Exception as e:
+            if _is_fatal_error(e):
+                raise
+            print(f"⚠️ OpenAI翻译失败: {e}")
+            return text  # 翻译失败时返回原文
 
-def batch_translate_slides(slides_data):
+def _chunk_texts(texts):
+    """
+    按条数和估算token数将文本块分组，每组作为一次打包请求
+    
+    自身含有"2. "这类编号行的文本无法与打包编号区分，单独成组
+    """
+    chunk = []
+    chunk_tokens = 0
+    for text in texts:
+        if _NUMBERED_ITEM_RE.search(text):
+            if chunk:
+                yield chunk
+                chunk = []
+                chunk_tokens = 0
+            yield [text]
+            continue
+        tokens = _estimate_tokens(text)
+        if chunk and (len(chunk) >= MAX_TEXTS_PER_REQUEST
+                      or chunk_tokens + tokens > MAX_INPUT_TOKENS_PER_REQUEST):
+            yield chunk
+            chunk = []
+            chunk_tokens = 0
+        chunk.append(text)
+        chunk_tokens += tokens
+    if chunk:
+        yield chunk
+
+def _parse_numbered_translation(content, expected_count):
+    """
+    解析编号列表形式的翻译结果，编号不连续或条数不符时返回None
+    """
+    parts = _NUMBERED_ITEM_RE.split(content.strip())
+    numbers = [int(n) for n in parts[1::2]]
+    if parts[0].strip() or numbers != list(range(1, expected_count + 1)):
+        return None
+    return [item.strip() for item in parts[2::2]]
+
+async def translate_batch(texts, sem, aclient):
     """
-    批量翻译幻灯片内容
+    将多个文本块编号后合并为一次请求翻译，分摊系统提示词的开销
+    
+    解析结果与原文条数不符或请求失败时，将批次对半拆分后重试，
+    直到退化为单条翻译；只有单条翻译仍失败时才保留原文。
+    鉴权、权限、模型不存在、额度用尽等错误不拆分，直接抛出中止翻译。
     
     Args:
-        slides_data (list): 幻灯片数据
+        texts (list): 要翻译的文本列表
+        sem (asyncio.Semaphore): 限制并发请求数的信号量
+        aclient (AsyncOpenAI): 本次运行使用的异步客户端
     
     Returns:
-        list: 翻译后的幻灯片数据
+        list: 与texts一一对应的日语译文
+    """
+    if len(texts) == 1:
+        return [await translate_to_japanese(texts[0], sem, aclient)]
+    
+    numbered = "\n".join(f"{i}. {text}" for i, text in enumerate(texts, start=1))
+    translated = None
+    async with sem:
+        try:
+            response = await _create_chat_completion(
+                aclient,
+                _estimate_request_tokens(numbered),
+                model=MODEL,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": TRANSLATION_SYSTEM_PROMPT
+                    },
+                    {
+                        "role": "user",
+                        "content": f"翻译以下编号中文，保持编号与换行对应:\n{numbered}"
+                    }
+                ],
+                temperature=TEMPERATURE,
+                max_tokens=_max_output_tokens(numbered, BATCH_MAX_TOKENS)
+            )
+            choice = response.choices[0]
+            if choice.finish_reason == "length":
+                print("⚠️ 打包译文被截断，拆分后重试")
+            else:
+                translated = _parse_numbered_translation(choice.message.content, len(texts))
+        except Exception as e:
+            if _is_fatal_error(e):
+                raise
+            print(f"⚠️ 打包请求失败，拆分后重试: {e}")
+    
+    if translated is not None:
+        _cache_put_many(zip(texts, translated))
+        return translated
+    
+    # 请求失败或结果无法对应时对半拆分重试
+    mid = len(texts) // 2
+    first, second = await asyncio.gather(
+        translate_batch(texts[:mid], sem, aclient),
+        translate_batch(texts[mid:], sem, aclient)
+    )
+    return first + second
+
+def _collect_pending_texts(slides_data):
+    """
+    收集所有不重复的原文，返回 (已缓存的 {原文: 译文}, 待翻译的原文列表)
+    
+    页眉、页脚等在多页重复出现的文本只翻译一次
+    """
+    translations = {}
+    pending = []
+    unique_texts = dict.fromkeys(
+        text_item["content"] for slide in slides_data for text_item in slide["texts"]
+    )
+    for text in unique_texts:
+        cached = _cache_get(text)
+        if cached is not None:
+            translations[text] = cached
+        else:
+            pending.append(text)
+    return translations, pending
+
+def _merge_translations(slides_data, translations):
+    """
+    按 {原文: 译文} 写回幻灯片结构，缺失的译文保留原文
     """
     translated_slides = []
     
@@ -136,45 +576,207 @@ def batch_translate_slides(slides_data):
         
         for text_item in slide["texts"]:
             original_text = text_item["content"]
-            translated_text = translate_to_japanese(original_text)
-            
             translated_slide["texts"].append({
-                "content": translated_text,
+                "content": translations.get(original_text, original_text),
                 "original_content": original_text  # 保留原文
             })
-            
-            # 添加延迟避免API限制
-            time.sleep(1)  # OpenAI API建议的延迟时间
         
         translated_slides.append(translated_slide)
-        print(f"✅ 第{slide['slide_number']}页翻译完成")
     
+    print(f"✅ 翻译完成，共 {len(translated_slides)} 页")
     return translated_slides
 
-def replace_ppt_text_with_translation(ppt_path, translated_data, output_path):
+async def _batch_translate_slides_async(slides_data):
+    """
+    并发翻译所有幻灯片的文本块，并按原结构组装结果
+    """
+    # 去重并查缓存，只有未命中的文本才需要请求API
+    translations, pending = _collect_pending_texts(slides_data)
+    
+    # 打包成若干请求，一次性并发发出
+    chunks = list(_chunk_texts(pending))
+    
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    async with _create_async_client() as aclient:
+        chunk_results = await asyncio.gather(*[translate_batch(chunk, sem, aclient) for chunk in chunks])
+    results = [text for chunk_result in chunk_results for text in chunk_result]
+    
+    translations.update(zip(pending, results))
+    return _merge_translations(slides_data, translations)
+
+def batch_translate_slides(slides_data):
+    """
+    批量翻译幻灯片内容（多个文本块打包为一次请求，最多同时 MAX_CONCURRENT_REQUESTS 个请求）
+    
+    Args:
+        slides_data (list): 幻灯片数据
+    
+    Returns:
+        list: 翻译后的幻灯片数据
+    """
+    return asyncio.run(_batch_translate_slides_async(slides_data))
+
+def batch_translate_slides_via_batch_api(slides_data, poll_interval=BATCH_POLL_INTERVAL):
+    """
+    通过OpenAI Batch API离线翻译整套幻灯片（费用减半，不受RPM限制）
+    
+    所有文本块作为一个JSONL批处理任务提交，轮询直到任务结束后取回结果。
+    任务最长可能需要24小时，适合大型PPT的离线处理。
+    
+    Args:
+        slides_data (list): 幻灯片数据
+        poll_interval (int): 轮询任务状态的间隔秒数
+    
+    Returns:
+        list: 翻译后的幻灯片数据
+    """
+    translations, pending = _collect_pending_texts(slides_data)
+    
+    lines = []
+    for text_idx, text in enumerate(pending):
+        lines.append(json.dumps({
+            "custom_id": str(text_idx),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": MODEL,
+                "messages": _build_messages(text),
+                "temperature": TEMPERATURE,
+                "max_tokens": _max_output_tokens(text, MAX_OUTPUT_TOKENS)
+            }
+        }, ensure_ascii=False))
+    
+    if not lines:
+        return _merge_translations(slides_data, translations)
+    
+    # 上传批处理输入文件并创建任务
+    client = _get_client()
+    batch_input = io.BytesIO("\n".join(lines).encode("utf-8"))
+    input_file = client.files.create(file=("batch_input.jsonl", batch_input), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    print(f"📤 已提交批处理任务 {batch.id}，共 {len(lines)} 个文本块")
+    
+    # 轮询任务状态
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+        print(f"⏳ 批处理任务状态: {batch.status}")
+    
+    if batch.status != "completed":
+        raise RuntimeError(f"批处理任务未完成: {batch.id} ({batch.status})")
+    
+    # 按 custom_id 解析翻译结果
+    results = []
+    if batch.output_file_id:
+        output = client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                print(f"⚠️ OpenAI翻译失败: {record['custom_id']} {record.get('error')}")
+                continue
+            choice = response["body"]["choices"][0]
+            if choice.get("finish_reason") == "length":
+                print(f"⚠️ OpenAI译文被截断，保留原文: {record['custom_id']}")
+                continue
+            original_text = pending[int(record["custom_id"])]
+            translated_text = choice["message"]["content"].strip()
+            results.append((original_text, translated_text))
+    translations.update(results)
+    _cache_put_many(results)
+    
+    # 请求级失败（如参数错误、超出上下文）只写入错误文件，对应文本保留原文
+    if batch.error_file_id:
+        errors = client.files.content(batch.error_file_id).text
+        for line in errors.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            error = record.get("error") or (record.get("response") or {}).get("body", {}).get("error")
+            print(f"⚠️ OpenAI翻译失败: {record['custom_id']} {error}")
+    
+    failed = batch.request_counts.failed if batch.request_counts else 0
+    if failed:
+        print(f"⚠️ 批处理任务中 {failed}/{len(lines)} 个请求失败，对应文本保留原文")
+    
+    return _merge_translations(slides_data, translations)
+
+def _set_text_keep_format(text_frame, text):
+    """
+    按段落就地替换文本，保留每段第一个run的字体、字号、颜色等格式
+    
+    译文每行对应一个段落；行数多于段落时复制最后一段作为格式模板，
+    少于段落时删除多余段落。行内的软换行（\v）还原为 a:br。
+    """
+    lines = text.split("\n")
+    
+    # 提取时 strip() 去掉了开头的空段落，这里同样跳过，保证译文行与段落对齐
+    start = 0
+    all_paragraphs = text_frame.paragraphs
+    while start < len(all_paragraphs) - 1 and not all_paragraphs[start].text.strip():
+        start += 1
+    paragraphs = all_paragraphs[start:]
+    
+    last_p = paragraphs[-1]._p
+    for _ in range(len(lines) - len(paragraphs)):
+        last_p.addnext(copy.deepcopy(last_p))
+    for paragraph in paragraphs[len(lines):]:
+        paragraph._p.getparent().remove(paragraph._p)
+    
+    for paragraph, line in zip(text_frame.paragraphs[start:], lines):
+        runs = paragraph.runs
+        first_r = runs[0]._r if runs else paragraph.add_run()._r
+        
+        # 只保留第一个run，其余run、换行和域删除
+        for el in paragraph._p.xpath("./a:r[position()>1] | ./a:br | ./a:fld"):
+            paragraph._p.remove(el)
+        
+        # 软换行处插入 a:br，之后的文字复制第一个run的格式
+        pieces = line.split("\v")
+        first_r.text = pieces[0]
+        last = first_r
+        for piece in pieces[1:]:
+            br = OxmlElement("a:br")
+            if first_r.rPr is not None:
+                br.append(copy.deepcopy(first_r.rPr))
+            new_r = copy.deepcopy(first_r)
+            new_r.text = piece
+            last.addnext(br)
+            br.addnext(new_r)
+            last = new_r
+
+def replace_ppt_text_with_translation(prs, translated_data, output_path):
     """
     将PPT中的文本替换为翻译后的日语文本
     
     Args:
-        ppt_path (str): 原PPT文件路径
+        prs (Presentation): 提取内容时使用的PPT对象
         translated_data (list): 翻译后的数据
         output_path (str): 输出PPT文件路径
     """
-    prs = Presentation(ppt_path)
+    # 按页码建立索引，避免每页都线性查找
+    by_num = {s["slide_number"]: s for s in translated_data}
     
     for i, slide in enumerate(prs.slides):
         slide_number = i + 1
-        translated_slide = next((s for s in translated_data if s["slide_number"] == slide_number), None)
+        translated_slide = by_num.get(slide_number)
         
-        if not translated_slide:
+        # 没有文本的页不需要遍历形状
+        if not translated_slide or not translated_slide["texts"]:
             continue
         
         text_index = 0
         for shape in slide.shapes:
-            if hasattr(shape, "text") and shape.text.strip():
+            if shape.has_text_frame and shape.text_frame.text.strip():
                 if text_index < len(translated_slide["texts"]):
-                    # 替换为翻译后的文本
-                    shape.text = translated_slide["texts"][text_index]["content"]
+                    # 替换为翻译后的文本，保留原有格式
+                    _set_text_keep_format(shape.text_frame, translated_slide["texts"][text_index]["content"])
                     text_index += 1
     
     # 保存新的PPT文件
@@ -214,16 +816,20 @@ if __name__ == "__main__":
     try:
         # 步骤1: 提取内容
         print("🔍 步骤1: 提取PPT内容...")
-        slides_data = extract_ppt_content(ppt_file, output_dir="trip7_ppt_translation/extracted_content")
+        slides_data, prs = extract_ppt_content(ppt_file, output_dir="trip7_ppt_translation/extracted_content")
         
         # 步骤2: 翻译内容
         print("🌐 步骤2: 翻译内容到日语...")
-        translated_data = batch_translate_slides(slides_data)
+        # 只按去重且未命中缓存的文本数决定是否走Batch API（可能需要等待数小时）
+        _, pending = _collect_pending_texts(slides_data)
+        if len(pending) >= BATCH_API_MIN_TEXTS:
+            translated_data = batch_translate_slides_via_batch_api(slides_data)
+        else:
+            translated_data = batch_translate_slides(slides_data)
         
         # 保存翻译后的JSON
         translated_json_path = "trip7_ppt_translation/extracted_content/translated_content.json"
-        with open(translated_json_path, "w", encoding="utf-8") as f:
-            json.dump(translated_data, f, ensure_ascii=False, indent=2)
+        _write_json(translated_json_path, translated_data)
         print(f"💾 翻译结果已保存到: {translated_json_path}")
         
         # 步骤3: 创建日语版PPT
@@ -232,7 +838,7 @@ if __name__ == "__main__":
         os.makedirs(japanese_dir, exist_ok=True)
         
         output_ppt_path = os.path.join(japanese_dir, f"japanese_{ppt_files[0]}")
-        replace_ppt_text_with_translation(ppt_file, translated_data, output_ppt_path)
+        replace_ppt_text_with_translation(prs, translated_data, output_ppt_path)
         
         print("\n🎉 翻译工作流完成！")
         print(f"📊 处理了 {len(slides_data)} 页幻灯片")